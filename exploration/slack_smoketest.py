@@ -1,8 +1,10 @@
-import os, json, boto3, requests
+import os, boto3, orjson, urllib3
 
 SLACK_SECRET_NAME = os.getenv("SLACK_SECRET_NAME")  # either a full URL or a secret name
 
 _cached_url = None
+_http = urllib3.PoolManager()  # ships with botocore; reused across warm invokes
+
 def _slack_url():
     global _cached_url
     if _cached_url:
@@ -10,7 +12,7 @@ def _slack_url():
 
     sm = boto3.client("secretsmanager")
     resp = sm.get_secret_value(SecretId=SLACK_SECRET_NAME)
-    secret = json.loads(resp["SecretString"])
+    secret = orjson.loads(resp["SecretString"])
     _cached_url = secret["url"]
     return _cached_url
 
@@ -27,5 +29,5 @@ def lambda_handler(event, context):
         ],
     }
 
-    r = requests.post(url, json=payload, timeout=8)
-    return {"status_code": r.status_code, "text": r.text[:200]}
+    r = _http.request("POST", url, body=orjson.dumps(payload), headers={"Content-Type": "application/json"}, timeout=8)
+    return {"status_code": r.status, "text": r.data.decode("utf-8", "ignore")[:200]}
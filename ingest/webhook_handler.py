@@ -1,18 +1,24 @@
-import json, os, datetime, boto3
+import os, datetime, boto3, orjson
 
 s3 = boto3.client("s3")
 RAW_BUCKET = os.environ["RAW_BUCKET"]
 RAW_PREFIX = os.environ.get("RAW_PREFIX", "crm/lead_created")
 
+def dumps(obj):
+    # API Gateway expects a str body; orjson hands back compact UTF-8 bytes
+    return orjson.dumps(obj).decode()
+
+_UTC = datetime.timezone.utc
+
 def _iso_now():
-    return datetime.datetime.utcnow().replace(tzinfo=datetime.timezone.utc).isoformat()
+    return datetime.datetime.now(_UTC).isoformat()
 
 def lambda_handler(event, context):
     # API Gateway HTTP API will pass body as a JSON string
     try:
-        body = json.loads(event.get("body") or "{}")
+        body = orjson.loads(event.get("body") or b"{}")
     except Exception:
-        return {"statusCode": 400, "body": json.dumps({"error": "invalid JSON body"})}
+        return {"statusCode": 400, "body": dumps({"error": "invalid JSON body"})}
 
     # Defensive extraction (Close puts lead_id under event.lead_id)
     lead_id = (
@@ -21,7 +27,7 @@ def lambda_handler(event, context):
         or body.get("event", {}).get("object_id")
     )
     if not lead_id:
-        return {"statusCode": 400, "body": json.dumps({"error": "missing lead_id"})}
+        return {"statusCode": 400, "body": dumps({"error": "missing lead_id"})}
 
     # Stamp a couple of fields we’ll use later
     envelope = {
@@ -40,9 +46,10 @@ def lambda_handler(event, context):
     s3.put_object(
         Bucket=RAW_BUCKET,
         Key=key,
-        Body=json.dumps(envelope, separators=(",", ":"), ensure_ascii=False).encode("utf-8"),
+        Body=orjson.dumps(envelope),
         ContentType="application/json",
         ServerSideEncryption="AES256",
+        ChecksumAlgorithm="CRC32",  # zlib-backed; CRC32C would require awscrt
     )
 
-    return {"statusCode": 200, "body": json.dumps({"ok": True, "lead_id": lead_id})}
+    return {"statusCode": 200, "body": dumps({"ok": True, "lead_id": lead_id})}
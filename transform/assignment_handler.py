@@ -1,8 +1,12 @@
-import os, json, time, random
-import urllib.parse, urllib.request, urllib.error
+import os, re, time, random
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
 
 from botocore.exceptions import ClientError
 import boto3
+import orjson
+import urllib3
 
 # --- Environment / constants ---
 SKIP_OWNER_LOOKUP = os.getenv("SKIP_OWNER_LOOKUP", "false").lower() == "true"
@@ -14,54 +18,75 @@ RAW_PREFIX        = "crm/lead_created"
 CURATED_PREFIX    = "crm/lead_enriched"
 ERR_PREFIX        = "crm/errors"
 
+# crm/lead_created/dt=YYYY-MM-DD/lead_id=<LEAD_ID>/crm_event_<LEAD_ID>.json
+_RAW_KEY_RE = re.compile(rf"^{re.escape(RAW_PREFIX)}/dt=(?P<day>[^/]+)/lead_id=(?P<lead_id>[^/]+)/")
+
 RETRY_TRANSIENT   = 2  # small in-function retries for transient HTTP issues
+RETRY_MAX_DELAY   = 2.0  # seconds; cap on the exponential backoff
+MAX_WORKERS       = int(os.getenv("MAX_WORKERS", "10"))  # SQS batch size default
 
 # --- Clients (reuse across invokes) ---
 s3 = boto3.client("s3")
-secrets = boto3.client("secretsmanager")
+_pool = ThreadPoolExecutor(max_workers=MAX_WORKERS)  # boto3 clients are thread-safe
+# owner + Slack hosts; keep-alive sockets survive between warm invokes
+_http = urllib3.PoolManager(num_pools=2, maxsize=MAX_WORKERS, retries=False)
+HTTP_TIMEOUT = urllib3.Timeout(connect=2, read=5)
 
 # --- Helpers ---
+_UTC = timezone.utc
+
 def _now_iso():
-    from datetime import datetime, timezone
-    return datetime.now(timezone.utc).isoformat()
+    return datetime.now(_UTC).isoformat()
 
 def _read_json_from_s3(bucket, key):
     obj = s3.get_object(Bucket=bucket, Key=key)
-    return json.loads(obj["Body"].read())
+    return orjson.loads(obj["Body"].read())
 
 def _write_json_to_s3(bucket, key, payload):
     s3.put_object(
         Bucket=bucket,
         Key=key,
-        Body=json.dumps(payload, separators=(",", ":"), ensure_ascii=False).encode("utf-8"),
+        Body=orjson.dumps(payload),
         ContentType="application/json",
         ServerSideEncryption="AES256",
+        ChecksumAlgorithm="CRC32",  # zlib-backed; CRC32C would require awscrt
     )
 
+class HTTPError(Exception):
+    """Error status from an outbound request (urllib3 returns these instead of raising)."""
+    def __init__(self, url: str, code: int, reason: str | None = None):
+        super().__init__(f"HTTP Error {code}: {reason}")
+        self.url = url
+        self.code = code
+
 def classify_lookup_error(err: Exception) -> str:
     """Return 'permanent' | 'transient' | 'unknown' based on HTTP error semantics."""
-    if isinstance(err, urllib.error.HTTPError):
+    if isinstance(err, HTTPError):
         if 400 <= err.code < 500:
             return "permanent"   # 404/403/400 etc. won’t heal
         if 500 <= err.code < 600:
             return "transient"
-    if isinstance(err, urllib.error.URLError):
-        return "transient"
+    if isinstance(err, urllib3.exceptions.HTTPError):
+        return "transient"   # connect/read timeouts, resets, TLS errors
     return "unknown"
 
 def fetch_owner_json(owner_url: str) -> dict:
     """Fetch owner JSON with tiny local retries for transient issues."""
     last = None
-    for _ in range(RETRY_TRANSIENT + 1):
+    for attempt in range(RETRY_TRANSIENT + 1):
         try:
-            with urllib.request.urlopen(owner_url, timeout=5) as resp:
-                return json.loads(resp.read())
+            resp = _http.request("GET", owner_url, timeout=HTTP_TIMEOUT)
+            if resp.status >= 400:
+                raise HTTPError(owner_url, resp.status, resp.reason)
+            return orjson.loads(resp.data)
         except Exception as e:
             last = e
             if classify_lookup_error(e) == "permanent":
                 raise
-            # transient: small scattered backoff
-            time.sleep(0.4 + random.random() * 0.4)
+            if attempt == RETRY_TRANSIENT:
+                break
+            # transient: capped exponential backoff with jitter
+            time.sleep(min(RETRY_MAX_DELAY, 0.2 * 2 ** attempt) + random.uniform(0, 0.1))
     # bubble up as transient/unknown
     raise last
 
@@ -79,124 +104,169 @@ def _write_error_artifact(day: str, lead_id: str, reason: str, extra: dict | Non
 # --- Slack setup ---
 
 SLACK_SECRET_NAME = os.getenv("SLACK_SECRET_NAME")  # from Lambda env
+# Slack is optional; don't load the Secrets Manager client model unless it's configured
+secrets = boto3.client("secretsmanager") if SLACK_SECRET_NAME else None
 _slack_url_cache = None
+SLACK_MAX_BLOCKS  = 50  # Slack rejects messages with more blocks than this
 
 def _slack_url() -> str | None:
+    global _slack_url_cache
+    if _slack_url_cache:
+        return _slack_url_cache
     if not SLACK_SECRET_NAME:
         return None
     try:
         sec = secrets.get_secret_value(SecretId=SLACK_SECRET_NAME)
         val = sec.get("SecretString") or "{}"
-        data = json.loads(val)
+        data = orjson.loads(val)
         url = data.get("url") or data.get("webhook") or data.get("SLACK_WEBHOOK_URL")
+        # only cache a resolved URL so a failed read is retried on the next invoke
+        _slack_url_cache = url
         return url
     except Exception as e:
         print(f"[slack] failed to read secret {SLACK_SECRET_NAME}: {e}")
         return None
 
+# Resolve during cold-start init so warm invokes skip the Secrets Manager call
+_slack_url()
+
 def _post_slack(webhook_url: str, payload: dict) -> tuple[int, str]:
-    data = json.dumps(payload).encode("utf-8")
-    req = urllib.request.Request(
-        webhook_url,
-        data=data,
-        headers={"Content-Type": "application/json"},
-        method="POST",
-    )
     try:
-        with urllib.request.urlopen(req, timeout=5) as resp:
-            body = resp.read().decode("utf-8", "ignore")
-            return resp.getcode(), body
-    except urllib.error.HTTPError as e:
-        body = e.read().decode("utf-8", "ignore")
-        return e.code, body
+        resp = _http.request(
+            "POST",
+            webhook_url,
+            body=orjson.dumps(payload),
+            headers={"Content-Type": "application/json"},
+            timeout=HTTP_TIMEOUT,
+        )
+        return resp.status, resp.data.decode("utf-8", "ignore")
     except Exception as e:
         return 0, str(e)
 
+# Static parts of the per-lead message, built once at import
+_SLACK_HEADER = {"type": "header","text": {"type": "plain_text","text": "New Lead Enriched"}}
+_SLACK_FIELDS = (
+    # (label, enriched key, fallback)
+    ("*Name:*\n",       "display_name", "N/A"),
+    ("*Lead ID:*\n",    "lead_id",      "N/A"),
+    ("*Created:*\n",    "date_created", "N/A"),
+    ("*Label:*\n",      "status_label", "N/A"),
+    ("*Email:*\n",      "lead_email",   "N/A"),
+    ("*Lead Owner:*\n", "lead_owner",   "Unassigned"),
+    ("*Funnel:*\n",     "funnel",       "N/A"),
+)
+
+def _slack_lead_blocks(enriched: dict) -> list[dict]:
+    return [
+        _SLACK_HEADER,
+        {"type": "section","fields": [
+            {"type": "mrkdwn","text": f"{label}{enriched.get(field) or fallback}"}
+            for label, field, fallback in _SLACK_FIELDS
+        ]},
+        {"type": "context","elements":[{"type":"mrkdwn","text": f"Enriched at {enriched['enriched_at']}"}]},
+    ]
+
+def _slack_batches(lead_blocks: list[list[dict]]):
+    """Group per-lead block lists into as few messages as Slack's block limit allows."""
+    per_msg = max(1, SLACK_MAX_BLOCKS // max(len(b) for b in lead_blocks))
+    for i in range(0, len(lead_blocks), per_msg):
+        chunk = lead_blocks[i:i + per_msg]
+        text = "New Lead Alert" if len(chunk) == 1 else f"{len(chunk)} New Lead Alerts"
+        yield {"text": text, "blocks": [b for blocks in chunk for b in blocks]}
+
+# --- Record processing ---
+def _process_record(record: dict, enriched_at: str) -> list[list[dict]]:
+    """Enrich every lead referenced by one SQS record; return its Slack block lists."""
+    lead_blocks = []
+
+    # each record body may be raw S3 event or SNS-wrapped S3 event
+    body = orjson.loads(record["body"])
+    s3_event = orjson.loads(body.get("Message")) if "Message" in body else body
+
+    for rec in s3_event.get("Records", []):
+        bucket = rec["s3"]["bucket"]["name"]
+        key    = urllib.parse.unquote_plus(rec["s3"]["object"]["key"])
+
+        m = _RAW_KEY_RE.match(key)
+        if not m:
+            continue
+
+        day     = m["day"]
+        lead_id = m["lead_id"]
+
+        # Load raw event JSON
+        raw  = _read_json_from_s3(bucket, key)
+        data = raw.get("event", {}).get("data", {})
+
+        owner_payload = {}
+        lookup_status = "skipped" if SKIP_OWNER_LOOKUP else "ok"
+
+        if not SKIP_OWNER_LOOKUP:
+            owner_url = f"{OWNER_BASE}/{lead_id}.json"
+            try:
+                owner_payload = fetch_owner_json(owner_url)
+            except Exception as e:
+                kind = classify_lookup_error(e)
+                if kind == "permanent":
+                    # Write failure artifact and proceed WITHOUT raising (consume message)
+                    _write_error_artifact(
+                        day, lead_id,
+                        reason=f"permanent:{type(e).__name__}",
+                        extra={"detail": str(e)}
+                    )
+                    lookup_status = "permanent_failed"
+                    owner_payload = {}
+                else:
+                    # transient/unknown: raise so SQS retries and eventually DLQs
+                    raise
+
+        enriched = {
+            "lead_id": lead_id,
+            "display_name": data.get("display_name"),
+            "status_label": data.get("status_label"),
+            "date_created": data.get("date_created"),
+            "lead_email": owner_payload.get("lead_email"),
+            "lead_owner": owner_payload.get("lead_owner"),
+            "funnel": owner_payload.get("funnel"),
+            "assignee": owner_payload.get("lead_owner"),  # mirrors owner if present
+            "enriched_at": enriched_at,
+            "owner_lookup_status": lookup_status,
+        }
+
+        out_key = f"{CURATED_PREFIX}/dt={day}/lead_id={lead_id}/lead_{lead_id}.json"
+        _write_json_to_s3(CURATED_BUCKET, out_key, enriched)
+
+        # --- Slack Notification (collected, posted once per batch) ---
+        if SLACK_SECRET_NAME:
+            lead_blocks.append(_slack_lead_blocks(enriched))
+
+    return lead_blocks
+
 # --- Handler ---
 def lambda_handler(event, context):
-    # SQS event → each record body may be raw S3 event or SNS-wrapped S3 event
-    for record in event.get("Records", []):
-        body = json.loads(record["body"])
-        s3_event = json.loads(body.get("Message")) if "Message" in body else body
-
-        for rec in s3_event.get("Records", []):
-            bucket = rec["s3"]["bucket"]["name"]
-            key    = urllib.parse.unquote_plus(rec["s3"]["object"]["key"])
-
-            # Expect: crm/lead_created/dt=YYYY-MM-DD/lead_id=<LEAD_ID>/crm_event_<LEAD_ID>.json
-            if not key.startswith(f"{RAW_PREFIX}/"):
-                continue
-
-            parts = key.split("/")
-            if len(parts) < 5 or parts[0] != "crm" or parts[1] != "lead_created":
-                continue
-
-            day     = parts[2].split("=", 1)[1]     # dt=YYYY-MM-DD
-            lead_id = parts[3].split("=", 1)[1]     # lead_id=<LEAD_ID>
-
-            # Load raw event JSON
-            raw  = _read_json_from_s3(bucket, key)
-            data = raw.get("event", {}).get("data", {})
-
-            owner_payload = {}
-            lookup_status = "skipped" if SKIP_OWNER_LOOKUP else "ok"
-
-            if not SKIP_OWNER_LOOKUP:
-                owner_url = f"{OWNER_BASE}/{lead_id}.json"
-                try:
-                    owner_payload = fetch_owner_json(owner_url)
-                except Exception as e:
-                    kind = classify_lookup_error(e)
-                    if kind == "permanent":
-                        # Write failure artifact and proceed WITHOUT raising (consume message)
-                        _write_error_artifact(
-                            day, lead_id,
-                            reason=f"permanent:{type(e).__name__}",
-                            extra={"detail": str(e)}
-                        )
-                        lookup_status = "permanent_failed"
-                        owner_payload = {}
-                    else:
-                        # transient/unknown: raise so SQS retries and eventually DLQs
-                        raise
-
-            enriched = {
-                "lead_id": lead_id,
-                "display_name": data.get("display_name"),
-                "status_label": data.get("status_label"),
-                "date_created": data.get("date_created"),
-                "lead_email": owner_payload.get("lead_email"),
-                "lead_owner": owner_payload.get("lead_owner"),
-                "funnel": owner_payload.get("funnel"),
-                "assignee": owner_payload.get("lead_owner"),  # mirrors owner if present
-                "enriched_at": _now_iso(),
-                "owner_lookup_status": lookup_status,
-            }
-
-            out_key = f"{CURATED_PREFIX}/dt={day}/lead_id={lead_id}/lead_{lead_id}.json"
-            _write_json_to_s3(CURATED_BUCKET, out_key, enriched)
-
-            # --- Slack Notification ---
-            hook = _slack_url()
-            if hook:
-                msg = {
-                    "text": "New Lead Alert",
-                    "blocks": [
-                        {"type": "header","text": {"type": "plain_text","text": "New Lead Enriched"}},
-                        {"type": "section","fields": [
-                            {"type": "mrkdwn","text": f"*Name:*\n{enriched.get('display_name') or 'N/A'}"},
-                            {"type": "mrkdwn","text": f"*Lead ID:*\n{lead_id}"},
-                            {"type": "mrkdwn","text": f"*Created:*\n{enriched.get('date_created') or 'N/A'}"},
-                            {"type": "mrkdwn","text": f"*Label:*\n{enriched.get('status_label') or 'N/A'}"},
-                            {"type": "mrkdwn","text": f"*Email:*\n{enriched.get('lead_email') or 'N/A'}"},
-                            {"type": "mrkdwn","text": f"*Lead Owner:*\n{enriched.get('lead_owner') or 'Unassigned'}"},
-                            {"type": "mrkdwn","text": f"*Funnel:*\n{enriched.get('funnel') or 'N/A'}"},
-                        ]},
-                        {"type": "context","elements":[{"type":"mrkdwn","text": f"Enriched at {enriched['enriched_at']}"}]},
-                    ],
-                }
-                status, body = _post_slack(hook, msg)
-                print(f"[slack] post status={status} body={body[:200]}")
-
-        # Success → SQS deletes the messages we processed in this batch
-        return {"ok": True}
+    slack_blocks = []  # one block list per enriched lead
+    enriched_at  = _now_iso()  # one clock read per batch
+
+    batch_item_failures = []
+
+    # Records are I/O bound (S3 + owner HTTP), so fan them out across threads
+    futures = [
+        (record["messageId"], _pool.submit(_process_record, record, enriched_at))
+        for record in event.get("Records", [])
+    ]
+    for message_id, fut in futures:
+        try:
+            slack_blocks.extend(fut.result())
+        except Exception as e:
+            # Only this message is redriven; the rest of the batch is deleted
+            print(f"[batch] record {message_id} failed: {type(e).__name__}: {e}")
+            batch_item_failures.append({"itemIdentifier": message_id})
+
+    hook = _slack_url() if slack_blocks else None
+    if hook:
+        for msg in _slack_batches(slack_blocks):
+            status, body = _post_slack(hook, msg)
+            print(f"[slack] post status={status} body={body[:200]}")
+
+    # Requires ReportBatchItemFailures on the SQS event source mapping
+    return {"batchItemFailures": batch_item_failures}